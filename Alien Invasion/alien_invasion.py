@@ -22,8 +22,8 @@ from scoreboard import Scoreboard
 class AlienInvasion:
     """Overall class to manage game assets and behaviours."""
 
-    def __init__(self):
-        """Initialize the game, and create game resources."""
+    def __init__(self, screen_size=None):
+        """Initialize the game, and create game resources. Use fullscreen unless a screen size is given."""
         pygame.init()
 
         # Initialize a storage path to save high-score
@@ -31,7 +31,10 @@ class AlienInvasion:
 
         # Initialize the settings and set up display, clock and title
         self.settings = Settings()
-        self.screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
+        if screen_size is None:
+            self.screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
+        else:
+            self.screen = pygame.display.set_mode(screen_size)
         self.settings.screen_width = self.screen.get_rect().width
         self.settings.screen_height = self.screen.get_rect().height
         self.clock = pygame.time.Clock()
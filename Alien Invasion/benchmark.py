@@ -0,0 +1,403 @@
+"""A headless performance regression suite for the Alien Invasion game.
+
+Run it from the CMD to time the hot paths of the game and compare them against the stored baseline:
+
+    python benchmark.py             # compare against benchmark_baseline.json, exit with 1 on regression
+    python benchmark.py --record    # measure again and overwrite the baseline with the fastest of two passes
+
+The timings and frames depend on the machine and on the pygame and SDL versions, which are stored
+along with the baseline, so record a new baseline when either of them changes.
+
+Besides the timings, a scripted game is played and the rendered frames are hashed at fixed ticks,
+so any optimization of the drawing or game logic must stay pixel-identical to the reference.
+"""
+
+# built-in modules
+import os
+import sys
+import json
+import math
+import hashlib
+import argparse
+from time import perf_counter
+from pathlib import Path
+from statistics import median
+
+# Use the SDL dummy drivers so that the suite can run without a display or a sound card
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+# third-party modules, available via pip
+import pygame
+
+# private modules, created by the developer
+from alien_invasion import AlienInvasion
+from bullet import Bullet
+
+# The game loads its images and sounds with paths relative to its folder
+GAME_FOLDER = Path(__file__).resolve().parent
+
+# Resolutions and fleets to benchmark. A small fleet, the game's own fleet and a fleet packed
+# without spacing, so that the number of aliens differs at every resolution
+RESOLUTIONS = [(800, 600), (1200, 800), (1920, 1080)]
+FLEETS = ["small", "full", "packed"]
+SMALL_FLEET_SIZE = 3
+
+# Every metric is the median of several rounds, each round times a batch of calls lasting a few milliseconds
+ROUNDS = 21
+SAMPLE_SECONDS = 0.005
+
+# A baseline keeps the fastest of several passes, a check re-measures slow metrics up to the same number of passes
+PASSES = 2
+
+# Allowed slowdown of a metric compared to its baseline before it counts as a regression.
+# Short metrics are also allowed an absolute slowdown, as a few microseconds are within the noise
+DEFAULT_TOLERANCE = 0.25
+ABSOLUTE_TOLERANCE_US = 10.0
+
+# Ticks of the scripted game at which the rendered frame is hashed
+GOLDEN_TICKS = [0, 30, 60, 120, 180, 240]
+
+# Scripted inputs for the golden game: tick -> list of (event type, key)
+SCRIPT = {
+    5: [(pygame.KEYDOWN, pygame.K_RIGHT)],
+    10: [(pygame.KEYDOWN, pygame.K_SPACE)],
+    25: [(pygame.KEYDOWN, pygame.K_SPACE)],
+    40: [(pygame.KEYUP, pygame.K_RIGHT), (pygame.KEYDOWN, pygame.K_SPACE)],
+    50: [(pygame.KEYDOWN, pygame.K_LEFT)],
+    60: [(pygame.KEYDOWN, pygame.K_SPACE)],
+    75: [(pygame.KEYDOWN, pygame.K_SPACE)],
+    90: [(pygame.KEYDOWN, pygame.K_SPACE)],
+    110: [(pygame.KEYUP, pygame.K_LEFT), (pygame.KEYDOWN, pygame.K_SPACE)],
+    150: [(pygame.KEYDOWN, pygame.K_RIGHT), (pygame.KEYDOWN, pygame.K_SPACE)],
+    170: [(pygame.KEYDOWN, pygame.K_SPACE)],
+    200: [(pygame.KEYUP, pygame.K_RIGHT), (pygame.KEYDOWN, pygame.K_SPACE)],
+}
+
+
+class PerformanceBenchmark:
+    """A class to measure the game's hot paths and check them against a stored baseline"""
+
+    def __init__(self, baseline_path, tolerance=DEFAULT_TOLERANCE, rounds=ROUNDS):
+        """Initialize the benchmark settings"""
+        self.baseline_path = Path(baseline_path)
+        self.tolerance = tolerance
+        self.rounds = rounds
+
+    def run_benchmarks(self, resolutions=RESOLUTIONS):
+        """Time every benchmark for the given resolutions and every fleet, return microseconds per call"""
+        metrics = {}
+        for resolution in resolutions:
+            game = self._make_game(resolution)
+            screen = f"{resolution[0]}x{resolution[1]}"
+
+            # The scoreboard doesn't depend on the fleet, so it is measured once per resolution
+            metrics[f"hud_update/{screen}"] = self._bench_hud_update(game)
+
+            measured_sizes = set()
+            for fleet in FLEETS:
+                self._build_fleet(game, fleet)
+
+                # Skip a fleet that ends up with as many aliens as one already measured
+                fleet_size = len(game.aliens)
+                if fleet_size in measured_sizes:
+                    continue
+                measured_sizes.add(fleet_size)
+                case = f"{screen}/fleet-{fleet_size}"
+
+                metrics[f"fleet_update/{case}"] = self._bench_fleet_update(game)
+                metrics[f"collision/{case}"] = self._bench_collision(game)
+                metrics[f"bullet_culling/{case}"] = self._bench_bullet_culling(game)
+                metrics[f"frame_render/{case}"] = self._bench_frame_render(game)
+        return metrics
+
+    def measure_metrics(self, passes=PASSES):
+        """Warm up, then return the fastest time of every metric over the given number of passes"""
+        # An untimed pass over the first resolution, so that it isn't slowed down by cold caches
+        self.run_benchmarks(RESOLUTIONS[:1])
+
+        metrics = self.run_benchmarks()
+        for _ in range(passes - 1):
+            for name, metric in self.run_benchmarks().items():
+                metrics[name] = min(metrics.get(name, metric), metric)
+        return metrics
+
+    def hash_frames(self):
+        """Play the scripted game for every resolution and hash the frames at the golden ticks"""
+        frames = {}
+        for resolution in RESOLUTIONS:
+            game = self._make_game(resolution)
+
+            # Start the game the same way a player would, by clicking the Play button
+            game._check_play_button(game.play_button.rect.center)
+
+            for tick in range(max(GOLDEN_TICKS) + 1):
+                for event_type, key in SCRIPT.get(tick, []):
+                    pygame.event.post(pygame.event.Event(event_type, key=key))
+
+                # Same steps as one pass through the main loop, without waiting on the clock
+                game._check_events()
+                if game.game_active:
+                    game.ship.update()
+                    game._update_bullets()
+                    game._update_aliens()
+                game._update_screen()
+
+                if tick in GOLDEN_TICKS:
+                    frame = pygame.image.tostring(game.screen, "RGB")
+                    name = f"{resolution[0]}x{resolution[1]}/tick-{tick}"
+                    frames[name] = hashlib.sha256(frame).hexdigest()
+        return frames
+
+    def record_baseline(self):
+        """Measure everything and store it as the new baseline"""
+        baseline = {
+            "environment": self._environment(),
+            "tolerance": self.tolerance,
+            "metrics": self.measure_metrics(),
+            "frames": self.hash_frames(),
+        }
+        self.baseline_path.write_text(json.dumps(baseline, indent=4, sort_keys=True) + "\n")
+        return baseline
+
+    def check_baseline(self):
+        """Compare fresh measurements with the baseline, return a list of failure messages"""
+        baseline = json.loads(self.baseline_path.read_text())
+        failures = []
+
+        # Timings may only get slower by the tolerance
+        metrics = self.measure_metrics(passes=1)
+        slow_names = [name for name, reference in baseline["metrics"].items()
+                      if name in metrics and metrics[name] > self._limit(reference)]
+
+        # Measure the resolutions of slow metrics again, keeping the fastest pass like the baseline does
+        resolutions = [resolution for resolution in RESOLUTIONS
+                       if any(name.split("/")[1] == f"{resolution[0]}x{resolution[1]}" for name in slow_names)]
+        if resolutions:
+            for _ in range(PASSES - 1):
+                retry = self.run_benchmarks(resolutions)
+                for name in slow_names:
+                    metrics[name] = min(metrics[name], retry[name])
+
+        for name, reference in sorted(baseline["metrics"].items()):
+            if name not in metrics:
+                failures.append(f"{name}: metric missing from this run")
+                continue
+            limit = self._limit(reference)
+            status = "ok" if metrics[name] <= limit else "REGRESSED"
+            print(f"{name:45} {reference:10.1f} us -> {metrics[name]:10.1f} us  {status}")
+            if status != "ok":
+                failures.append(f"{name}: {metrics[name]:.1f} us exceeds {limit:.1f} us")
+
+        # A metric without a baseline usually means a fleet size changed, so it has a new name
+        for name in sorted(set(metrics) - set(baseline["metrics"])):
+            print(f"{name:45} {'':>10}    -> {metrics[name]:10.1f} us  NEW")
+            failures.append(f"{name}: metric missing from the baseline, record a new baseline with --record")
+
+        # Rendered frames must match exactly, which is only possible with the same pygame and SDL
+        environment = self._environment()
+        if baseline.get("environment") != environment:
+            failures.append(f"frames can't be compared, the baseline was recorded with {baseline.get('environment')} "
+                            f"but this run uses {environment}; record a new baseline with --record")
+            return failures
+
+        frames = self.hash_frames()
+        for name, reference in sorted(baseline["frames"].items()):
+            if frames.get(name) != reference:
+                failures.append(f"{name}: rendered frame differs from the reference")
+        return failures
+
+    def _limit(self, reference):
+        """Return the slowest allowed time for a metric with the given baseline time"""
+        return max(reference * (1 + self.tolerance), reference + ABSOLUTE_TOLERANCE_US)
+
+    def _environment(self):
+        """Return the versions of the libraries that decide how frames are rendered"""
+        return {
+            "pygame": pygame.version.ver,
+            "sdl": ".".join(str(number) for number in pygame.get_sdl_version()),
+            "sdl_ttf": ".".join(str(number) for number in pygame.font.get_sdl_ttf_version()),
+        }
+
+    def _make_game(self, resolution):
+        """Create a game in a window of the given resolution, independent of any stored high score"""
+        game = AlienInvasion(resolution)
+        game.stats.high_score = 0
+        game.scoreboard.prepare_high_score()
+        return game
+
+    def _measure(self, action, setup=None):
+        """Return the median time of an action in microseconds, setup runs untimed before each call"""
+        def time_batch(batch_size):
+            """Return the total time of a batch of calls"""
+            total = 0.0
+            for _ in range(batch_size):
+                if setup:
+                    setup()
+                start = perf_counter()
+                action()
+                total += perf_counter() - start
+            return total
+
+        # Warm up and pick a batch size that makes every round last a few milliseconds
+        estimate = time_batch(10) / 10
+        batch_size = max(1, math.ceil(SAMPLE_SECONDS / max(estimate, 1e-9)))
+
+        samples = [time_batch(batch_size) / batch_size for _ in range(self.rounds)]
+        return median(samples) * 1_000_000
+
+    def _build_fleet(self, game, fleet):
+        """Put a fresh fleet of the given kind on the screen"""
+        game.settings.initialize_dynamic_settings()
+        game.bullets.empty()
+        game.aliens.empty()
+        game._create_fleet()
+
+        if fleet == "small":
+            for alien in game.aliens.sprites()[SMALL_FLEET_SIZE:]:
+                game.aliens.remove(alien)
+        elif fleet == "packed":
+            # Fill the same area as the game's fleet, but without gaps between the aliens
+            alien_width, alien_height = game.aliens.sprites()[0].rect.size
+            game.aliens.empty()
+            for y_position in range(alien_height, game.settings.screen_height - 3 * alien_height, alien_height):
+                for x_position in range(alien_width, game.settings.screen_width - 4 * alien_width, alien_width):
+                    game._create_alien(x_position, y_position)
+
+    def _snapshot(self, game):
+        """Remember the aliens and bullets on the screen, along with their positions"""
+        aliens = [(alien, alien.x, alien.rect.topleft) for alien in game.aliens.sprites()]
+        bullets = [(bullet, bullet.y, bullet.rect.topleft) for bullet in game.bullets.sprites()]
+        return aliens, bullets
+
+    def _restore(self, game, snapshot):
+        """Put the aliens and bullets of a snapshot back in place, without loading their images again"""
+        aliens, bullets = snapshot
+        game.settings.initialize_dynamic_settings()
+        game.aliens.empty()
+        game.bullets.empty()
+        for alien, x_position, topleft in aliens:
+            alien.x = x_position
+            alien.rect.topleft = topleft
+            game.aliens.add(alien)
+        for bullet, y_position, topleft in bullets:
+            bullet.y = y_position
+            bullet.rect.topleft = topleft
+            game.bullets.add(bullet)
+
+    def _bench_fleet_update(self, game):
+        """Time a single step of the fleet, including the edge and ship checks"""
+        snapshot = self._snapshot(game)
+        metric = self._measure(game._update_aliens, lambda: self._restore(game, snapshot))
+        self._restore(game, snapshot)
+        return metric
+
+    def _bench_collision(self, game):
+        """Time the bullet-alien collision check with bullets sitting on top of aliens"""
+        fleet = self._snapshot(game)
+        aliens = game.aliens.sprites()
+
+        # Leave at least one alien alive so that no new fleet is created
+        for alien in aliens[:min(game.settings.bullets_allowed, len(aliens) - 1)]:
+            bullet = Bullet(game)
+            bullet.rect.center = alien.rect.center
+            bullet.y = float(bullet.rect.y)
+            game.bullets.add(bullet)
+
+        snapshot = self._snapshot(game)
+
+        def setup():
+            # Start from the same score every time, so the same text is rendered
+            self._restore(game, snapshot)
+            game.stats.score = 0
+            game.stats.high_score = 0
+
+        metric = self._measure(game._check_bullet_alien_collision, setup)
+        self._restore(game, fleet)
+        return metric
+
+    def _bench_bullet_culling(self, game):
+        """Time the bullet update when half of the bullets leave the top of the screen"""
+        fleet = self._snapshot(game)
+        for number in range(game.settings.bullets_allowed):
+            bullet = Bullet(game)
+            if number % 2:
+                bullet.rect.bottom = 1
+                bullet.y = float(bullet.rect.y)
+            game.bullets.add(bullet)
+
+        snapshot = self._snapshot(game)
+        metric = self._measure(game._update_bullets, lambda: self._restore(game, snapshot))
+        self._restore(game, fleet)
+        return metric
+
+    def _bench_hud_update(self, game):
+        """Time the scoreboard refresh that follows a hit which sets a new high score"""
+        def setup():
+            # Start from the same score every time, so the same text is rendered
+            game.stats.score = 0
+            game.stats.high_score = 0
+
+        def action():
+            game.stats.score += game.settings.alien_points
+            game.scoreboard.prepare_score()
+            game.scoreboard.check_high_score()
+            game.scoreboard.prepare_level()
+
+        return self._measure(action, setup)
+
+    def _bench_frame_render(self, game):
+        """Time drawing and flipping a full frame during gameplay"""
+        fleet = self._snapshot(game)
+        for _ in range(game.settings.bullets_allowed):
+            game.bullets.add(Bullet(game))
+        game.game_active = True
+        metric = self._measure(game._update_screen)
+        game.game_active = False
+        self._restore(game, fleet)
+        return metric
+
+
+def main():
+    """Parse the command line and run the suite"""
+    parser = argparse.ArgumentParser(description="Alien Invasion performance regression suite")
+    parser.add_argument("--record", action="store_true", help="overwrite the baseline with new measurements")
+    parser.add_argument("--baseline", default=GAME_FOLDER / "benchmark_baseline.json",
+                        help="path of the baseline file")
+    parser.add_argument("--tolerance", type=float, default=None,
+                        help="allowed slowdown as a fraction, defaults to the value stored in the baseline")
+    parser.add_argument("--rounds", type=int, default=ROUNDS, help="timed rounds per metric")
+    arguments = parser.parse_args()
+
+    # Resolve the baseline from where the suite was started, then move to the game folder for its assets
+    benchmark = PerformanceBenchmark(Path(arguments.baseline).resolve(), rounds=arguments.rounds)
+    os.chdir(GAME_FOLDER)
+
+    if arguments.record:
+        benchmark.tolerance = arguments.tolerance if arguments.tolerance is not None else DEFAULT_TOLERANCE
+        baseline = benchmark.record_baseline()
+        print(f"Recorded {len(baseline['metrics'])} metrics and {len(baseline['frames'])} frames "
+              f"to {benchmark.baseline_path}")
+        return
+
+    if not benchmark.baseline_path.exists():
+        print(f"No baseline found at {benchmark.baseline_path}, record one with --record")
+        sys.exit(2)
+
+    # Use the tolerance stored along with the baseline unless one is given
+    if arguments.tolerance is not None:
+        benchmark.tolerance = arguments.tolerance
+    else:
+        benchmark.tolerance = json.loads(benchmark.baseline_path.read_text())["tolerance"]
+
+    failures = benchmark.check_baseline()
+    if failures:
+        print("\nPerformance regressions found:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\nAll metrics are within tolerance and all frames match the reference.")
+
+
+if __name__ == "__main__":
+    main()